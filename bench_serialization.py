@@ -0,0 +1,41 @@
+import json, timeit
+from uuid import uuid4
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from main import Listing
+
+# Compares the per-request cost of serializing listing payloads the old way
+# (per-row dicts through jsonable_encoder + JSONResponse) against Listing
+# records rendered by ORJSONResponse.
+
+SIZES = [10, 100, 1000]
+REPEAT = 5
+
+def make_rows(size):
+    return [
+        (uuid4(), "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description",
+         [f"https://bucket.s3.eu-north-1.amazonaws.com/{uuid4()}_image.jpg" for _ in range(3)])
+        for _ in range(size)
+    ]
+
+def as_dicts(rows):
+    return [dict(zip(Listing.__slots__, row)) for row in rows]
+
+def as_listings(rows):
+    return [Listing(*row) for row in rows]
+
+def default_response(rows):
+    return JSONResponse(jsonable_encoder({"listings": as_dicts(rows)})).body
+
+def orjson_response(rows):
+    return ORJSONResponse({"listings": as_listings(rows)}).body
+
+if __name__ == "__main__":
+    print(f"{'rows':>6} {'default (ms)':>14} {'orjson (ms)':>13} {'speedup':>9}")
+    for size in SIZES:
+        rows = make_rows(size)
+        assert json.loads(default_response(rows)) == json.loads(orjson_response(rows))
+        number = max(1, 2000 // size)
+        default_time = min(timeit.repeat(lambda: default_response(rows), number=number, repeat=REPEAT)) / number
+        orjson_time = min(timeit.repeat(lambda: orjson_response(rows), number=number, repeat=REPEAT)) / number
+        print(f"{size:>6} {default_time * 1000:>14.3f} {orjson_time * 1000:>13.3f} {default_time / orjson_time:>8.1f}x")
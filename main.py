@@ -1,9 +1,20 @@
-import boto3, psycopg2, os, logging
-from fastapi import FastAPI, Form, UploadFile, HTTPException, Query
+import boto3, psycopg2, os, logging, hashlib, itertools, time, random, asyncio, math
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import FastAPI, Form, UploadFile, HTTPException, Query, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.middleware.gzip import GZipResponder
+from brotli_asgi import BrotliResponder, Mode
+from pydantic import BaseModel, ValidationError, TypeAdapter, model_validator
+from pydantic_core import PydanticCustomError
 from dotenv import load_dotenv
 from uuid import UUID, uuid4
-from io import BytesIO
 
 # FastAPI App Configuration
 app = FastAPI(debug=True)
@@ -36,40 +47,285 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_DATABASE = os.getenv("DB_DATABASE")
 
+# Read replicas ("host" or "host:port", comma separated) used by the GET endpoints
+DB_READ_HOSTS = [host.strip() for host in os.getenv("DB_READ_HOSTS", "").split(",") if host.strip()]
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# Replicas are connected from inside request handlers, so keep this short: a dead host would otherwise block the event loop until the OS gives up
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+read_replicas = [{"host": host, "connection": None, "down_until": 0.0} for host in DB_READ_HOSTS]
+replica_counter = itertools.count()
+
+# Startup: connection retries back off exponentially with full jitter
+DB_CONNECT_BASE_DELAY = float(os.getenv("DB_CONNECT_BASE_DELAY", "0.5"))
+DB_CONNECT_MAX_DELAY = float(os.getenv("DB_CONNECT_MAX_DELAY", "30"))
+
+# Advisory lock key serializing schema migrations (see create_tables)
+SCHEMA_LOCK_ID = 4201730
+
+db_ready = False
+startup_task = None
+
+# HTTP caching policies for listing reads. Writes go to /listings/{id}, which never invalidates
+# cached /listings/id/{id} responses, so by default clients revalidate every time (a 304 costs
+# one indexed row lookup). A max-age here trades freshness, including for the writer, for fewer requests.
+LISTING_CACHE_CONTROL = os.getenv("LISTING_CACHE_CONTROL", "no-cache")
+LISTINGS_CACHE_CONTROL = os.getenv("LISTINGS_CACHE_CONTROL", "public, max-age=10")
+
+# Response compression (responses smaller than the threshold are sent as-is)
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_COMPRESS_LEVEL = int(os.getenv("GZIP_COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ETAG_ENCODINGS = ("br", "gzip")
+
+# Token bucket rate limits per client and route (rate in requests/second, burst in requests)
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+WRITE_RATE_LIMIT_RATE = float(os.getenv("WRITE_RATE_LIMIT_RATE", "1"))
+WRITE_RATE_LIMIT_BURST = float(os.getenv("WRITE_RATE_LIMIT_BURST", "5"))
+# Hard cap on tracked buckets; the least recently used bucket is evicted beyond it
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "10000"))
+# Number of proxies (e.g. the AWS load balancer) in front of the service that append to
+# X-Forwarded-For. With 0, clients are keyed by peer address, so behind a load balancer
+# all clients share one bucket; set this to 1 there.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+RATE_LIMIT_EXEMPT_PATHS = ("/health/", "/ready", "/metrics/limits")
+
+# Global admission control for multipart uploads
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "8"))
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.getenv("UPLOAD_MAX_INFLIGHT_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "2"))
+
+rate_limit_buckets = OrderedDict()
+limit_counters = {
+    "rate_limited": 0,
+    "uploads_admitted": 0,
+    "uploads_rejected": 0,
+    "uploads_too_large": 0,
+    "uploads_in_flight": 0,
+    "upload_bytes_in_flight": 0,
+}
+
 app = FastAPI()
 
+# Negotiates brotli or gzip per request. Both responders compress streamed bodies chunk by chunk.
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE, gzip_level=GZIP_COMPRESS_LEVEL, brotli_quality=BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encodings = accepted_encodings(request_headers.get("Accept-Encoding", ""))
+        if_none_match = request_headers.get("If-None-Match", "")
+
+        # Each content-coding gets its own strong ETag, and every response varies on Accept-Encoding
+        async def send_with_validators(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                if "accept-encoding" not in headers.get("Vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+
+                etag = headers.get("ETag")
+                encoding = headers.get("Content-Encoding")
+                if etag and encoding in ETAG_ENCODINGS:
+                    headers["ETag"] = encoded_etag(etag, encoding)
+                elif etag and message["status"] == 304:
+                    # Echo the variant the client revalidated, matching the ETag of its cached 200
+                    for encoding in ETAG_ENCODINGS:
+                        if encoded_etag(etag, encoding) in if_none_match:
+                            headers["ETag"] = encoded_etag(etag, encoding)
+                            break
+
+                message["headers"] = headers.raw
+            await send(message)
+
+        if "br" in encodings:
+            responder = BrotliResponder(self.app, self.brotli_quality, Mode.text, 22, 0, self.minimum_size)
+            await responder(scope, receive, send_with_validators)
+            return
+
+        if "gzip" in encodings:
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+            await responder(scope, receive, send_with_validators)
+            return
+
+        await self.app(scope, receive, send_with_validators)
+
+# Checked before the request body is read, so rejected uploads are never buffered
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        method = scope["method"]
+        is_write = method in ("POST", "PUT", "PATCH", "DELETE")
+
+        key = (client_id(scope, headers), method, route_path(scope))
+        rate, burst = (WRITE_RATE_LIMIT_RATE, WRITE_RATE_LIMIT_BURST) if is_write else (RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+        retry_after = take_token(key, rate, burst)
+        if retry_after:
+            limit_counters["rate_limited"] += 1
+            await limit_response(429, "Too many requests", retry_after)(scope, receive, send)
+            return
+
+        if not (is_write and headers.get("content-type", "").startswith("multipart/form-data")):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = int(headers.get("content-length") or UPLOAD_MAX_INFLIGHT_BYTES + 1)
+        if content_length > UPLOAD_MAX_INFLIGHT_BYTES:
+            limit_counters["uploads_too_large"] += 1
+            await limit_response(413, "Upload too large")(scope, receive, send)
+            return
+
+        if (limit_counters["uploads_in_flight"] >= UPLOAD_MAX_CONCURRENT
+                or limit_counters["upload_bytes_in_flight"] + content_length > UPLOAD_MAX_INFLIGHT_BYTES):
+            limit_counters["uploads_rejected"] += 1
+            await limit_response(503, "Server busy, retry later", UPLOAD_RETRY_AFTER)(scope, receive, send)
+            return
+
+        limit_counters["uploads_admitted"] += 1
+        limit_counters["uploads_in_flight"] += 1
+        limit_counters["upload_bytes_in_flight"] += content_length
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit_counters["uploads_in_flight"] -= 1
+            limit_counters["upload_bytes_in_flight"] -= content_length
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionMiddleware)
+
 # Database Connection
 def connect_db():
     global connection
+    new_connection = None
     try:
-        connection = psycopg2.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database=DB_DATABASE)
+        new_connection = psycopg2.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database=DB_DATABASE)
 
         # Create a cursor within the context manager
-        with connection.cursor() as cursor:
+        with new_connection.cursor() as cursor:
             cursor.execute("SELECT version();")
             db_version = cursor.fetchone()
 
         logger.info(f"Connected to {db_version[0]}")
-        create_tables()
+
+        # Handlers only see the connection once its schema setup has committed
+        if not create_tables(new_connection):
+            new_connection.close()
+            return False
+
+        connection = new_connection
         return True
 
     except (Exception, psycopg2.Error) as error:
         logger.error(f"Error while connecting to PostgreSQL: {error}")
+        if new_connection is not None:
+            new_connection.close()
         return False
 
-def startup_event():
-    while not connect_db():
-            continue
+async def connect_db_with_backoff():
+    global db_ready
+    attempt = 0
+    while not await asyncio.to_thread(connect_db):
+        delay = random.uniform(0, min(DB_CONNECT_MAX_DELAY, DB_CONNECT_BASE_DELAY * 2 ** min(attempt, 16)))
+        logger.info(f"Retrying database connection in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+    db_ready = True
+
+# Connect in the background so the worker starts serving (and answering probes) immediately
+async def startup_event():
+    global startup_task
+    startup_task = asyncio.create_task(connect_db_with_backoff())
+
+def shutdown_event():
+    if startup_task is not None:
+        startup_task.cancel()
     
 app.add_event_handler("startup", startup_event)
+app.add_event_handler("shutdown", shutdown_event)
+
 
+# Route dependency for handlers that need the database: 503 until startup has finished
+def require_db():
+    if not db_ready:
+        raise HTTPException(status_code=503, detail="Database not ready")
 
 @app.get("/health/")
 async def health():
     return {"status": "Server is healthy"}
 
-@app.post("/listings/")
-async def create_listing(
+@app.get("/ready")
+async def ready():
+    if not db_ready or connection is None or connection.closed:
+        raise HTTPException(status_code=503, detail="Database not ready")
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    except psycopg2.Error as e:
+        logger.error(f"Readiness check failed: {e}")
+        raise HTTPException(status_code=503, detail="Database not ready")
+    finally:
+        end_read_transaction(connection)
+
+    now = time.monotonic()
+    replicas_available = sum(1 for replica in read_replicas if replica["down_until"] <= now)
+
+    return {"status": "ready", "read_replicas": len(read_replicas), "read_replicas_available": replicas_available}
+
+# Listing payload shared by create/edit and bulk paths. Rules run in this order and
+# stop at the first failure, so every path reports the same message.
+class ListingData(BaseModel):
+    owner_email: str
+    animal_type: str
+    animal_breed: str
+    animal_age: int
+    animal_name: str
+    location: str
+    listing_type: str
+    animal_price: Optional[float] = None
+    description: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_listing_rules(self):
+        if self.animal_age <= 0 or (self.animal_price is not None and self.animal_price <= 0):
+            raise PydanticCustomError("listing", "Price and age must be greater than 0")
+
+        if self.listing_type not in ("SALE", "ADOPTION"):
+            raise PydanticCustomError("listing", "Invalid listing_type. Allowed values are 'SALE' or 'ADOPTION'.")
+
+        if self.listing_type == "SALE" and self.animal_price is None:
+            raise PydanticCustomError("listing", "Price is required for SALE listings")
+
+        if self.listing_type == "ADOPTION" and self.animal_price is not None:
+            raise PydanticCustomError("listing", "Price is not required for ADOPTION listings")
+
+        return self
+
+listing_batch_adapter = TypeAdapter(list[ListingData])
+
+def listing_error(error):
+    return error.errors()[0]["msg"]
+
+# Resolved by FastAPI before the handler runs, so rejected requests never touch the DB or S3
+def listing_form(
     owner_email: str = Form(...),
     animal_type: str = Form(...),
     animal_breed: str = Form(...),
@@ -79,130 +335,144 @@ async def create_listing(
     listing_type: str = Form(...),
     animal_price: float = Form(None),
     description: str = Form(None),
-    images: list[UploadFile] = Form([])
+):
+    try:
+        return ListingData(
+            owner_email=owner_email, animal_type=animal_type, animal_breed=animal_breed, animal_age=animal_age,
+            animal_name=animal_name, location=location, listing_type=listing_type, animal_price=animal_price,
+            description=description
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=listing_error(e))
+
+def listing_status_form(listing_status: str = Form(...)):
+    if listing_status != "ACCEPTED":
+        raise HTTPException(status_code=400, detail="Invalid listing_status. Allowed values are 'ACCEPTED'")
+    return listing_status
+
+def validate_listings(items):
+    try:
+        return listing_batch_adapter.validate_python(items), {}
+    except ValidationError:
+        pass
+
+    # Fall back to per-item validation to report every rejected index
+    listings, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            listings.append(ListingData.model_validate(item))
+        except ValidationError as e:
+            errors[index] = listing_error(e)
+    return listings, errors
+
+@app.get("/metrics/limits")
+async def limits_metrics():
+    return {**limit_counters, "rate_limit_buckets": len(rate_limit_buckets)}
+
+@app.post("/listings/", dependencies=[Depends(require_db)])
+async def create_listing(
+    listing: ListingData = Depends(listing_form),
+    images: list[UploadFile] = Form([]),
+    response: Response = None
 ):
     global connection
     try:
+        uploaded_images = upload_images(images)
+
         with connection.cursor() as cursor:
 
-            if animal_age <= 0 or (animal_price is not None and animal_price <= 0):
-                return HTTPException(status_code=400, detail="Price and age must be greater than 0")
-             
-            if listing_type not in ['SALE', 'ADOPTION']:
-                return HTTPException(status_code=400, detail="Invalid listing_type. Allowed values are 'SALE' or 'ADOPTION'.")
-            
-            if listing_type == "SALE" and animal_price is None:
-                return HTTPException(status_code=400, detail="Price is required for SALE listings")
-            
-            if listing_type == "ADOPTION" and animal_price is not None:
-                return HTTPException(status_code=400, detail="Price is not required for ADOPTION listings")
-            
             listing_id = insert_listing_data(
-                cursor, owner_email, animal_type, animal_breed,
-                animal_age, animal_name, location,listing_type, animal_price, description
+                cursor, listing.owner_email, listing.animal_type, listing.animal_breed,
+                listing.animal_age, listing.animal_name, listing.location, listing.listing_type, listing.animal_price, listing.description
             )
-            for image in images:
-                if image:
-                    image_url = upload_image_to_s3(image)
-                    insert_image_data(cursor, image.filename, image_url, listing_id)
+            for image_filename, image_url in uploaded_images:
+                insert_image_data(cursor, image_filename, image_url, listing_id)
 
             connection.commit()
+            mark_recent_write(response)
 
             return {"message": "Listing created successfully"}
     
     except Exception as e:
         connection.rollback()
         logger.error(f"Error updating listing: {e}")
-        return HTTPException(status_code=500, detail="Internal Server Error")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@app.put("/listings/{listing_id}")
+@app.put("/listings/{listing_id}", dependencies=[Depends(require_db)])
 async def edit_listing(
     listing_id: UUID,
-    owner_email: str = Form(...),
-    animal_type: str = Form(...),
-    animal_breed: str = Form(...),
-    animal_age: int = Form(...),
-    animal_name: str = Form(...),
-    location: str = Form(...),
-    listing_type: str = Form(...),
-    animal_price: float = Form(None),
-    description: str = Form(None),
+    listing: ListingData = Depends(listing_form),
     images: list[UploadFile] = Form([]),
+    response: Response = None,
 ):
     global connection
 
     try:
+        uploaded_images = upload_images(images)
+
         with connection.cursor() as cursor:
-                        
-            if animal_age <= 0 or (animal_price is not None and animal_price <= 0):
-                return HTTPException(status_code=400, detail="Price and age must be greater than 0")
-                
-            if listing_type not in ['SALE', 'ADOPTION']:
-                return HTTPException(status_code=400, detail="Invalid listing_type. Allowed values are 'SALE' or 'ADOPTION'.")
-        
-            if listing_type == "SALE" and animal_price is None:
-                return HTTPException(status_code=400, detail="Price is required for SALE listings")
-            
-            if listing_type == "ADOPTION" and animal_price is not None:
-                return HTTPException(status_code=400, detail="Price is not required for ADOPTION listings")
-            
+
             check_listing_query = "SELECT * FROM listings WHERE id = %s"
             cursor.execute(check_listing_query, (str(listing_id),))
             existing_listing = cursor.fetchone()
 
             if not existing_listing:
-                return HTTPException(status_code=404, detail="Listing not found")
+                raise HTTPException(status_code=404, detail="Listing not found")
 
-            update_listing(cursor, listing_id, owner_email, animal_type, animal_breed, animal_age, animal_name, location, listing_type, animal_price, description)
+            update_listing(cursor, listing_id, listing.owner_email, listing.animal_type, listing.animal_breed, listing.animal_age, listing.animal_name, listing.location, listing.listing_type, listing.animal_price, listing.description)
 
-            for image in images:
-                if image:
-                    image_url = upload_image_to_s3(image)
-                    insert_image_data(cursor, image.filename, image_url, str(listing_id))
+            for image_filename, image_url in uploaded_images:
+                insert_image_data(cursor, image_filename, image_url, str(listing_id))
 
             connection.commit()
+            mark_recent_write(response)
 
             return {"message": "Listing updated successfully"}
     
+    except HTTPException:
+        connection.rollback()
+        raise
     except Exception as e:
         connection.rollback()
         logger.error(f"Error updating listing: {e}")
-        return HTTPException(status_code=500, detail="Internal Server Error")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@app.put("/listings/{listing_id}/status")
+@app.put("/listings/{listing_id}/status", dependencies=[Depends(require_db)])
 async def update_listing_status(
     listing_id: UUID,
-    listing_status: str = Form(...)
+    listing_status: str = Depends(listing_status_form),
+    response: Response = None
 ):
     global connection
 
     try:
         with connection.cursor() as cursor:
 
-            if listing_status != "ACCEPTED":
-                return HTTPException(status_code=400, detail="Invalid listing_status. Allowed values are 'ACCEPTED'")
-            
             check_listing_query = "SELECT * FROM listings WHERE id = %s"
             cursor.execute(check_listing_query, (str(listing_id),))
             existing_listing = cursor.fetchone()
 
             if not existing_listing:
-                return HTTPException(status_code=404, detail="Listing not found")
+                raise HTTPException(status_code=404, detail="Listing not found")
 
-            update_listing_status_query = "UPDATE listings SET listing_status = %s WHERE id = %s"
+            update_listing_status_query = "UPDATE listings SET listing_status = %s, updated_at = now() WHERE id = %s"
             cursor.execute(update_listing_status_query, (listing_status, str(listing_id)))
 
             connection.commit()
+            mark_recent_write(response)
 
             return {"message": "Listing status updated successfully"}
     
+    except HTTPException:
+        connection.rollback()
+        raise
     except Exception as e:
         connection.rollback()
         logger.error(f"Error updating listing status: {e}")
-        return HTTPException(status_code=500, detail="Internal Server Error")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@app.delete("/listings/{listing_id}")
-async def delete_listing(listing_id: UUID):
+@app.delete("/listings/{listing_id}", dependencies=[Depends(require_db)])
+async def delete_listing(listing_id: UUID, response: Response):
     global connection
 
     try:
@@ -213,7 +483,7 @@ async def delete_listing(listing_id: UUID):
             existing_listing = cursor.fetchone()
 
             if not existing_listing:
-                return HTTPException(status_code=404, detail="Listing not found")
+                raise HTTPException(status_code=404, detail="Listing not found")
 
             delete_listing_query = "DELETE FROM listings WHERE id = %s"
             cursor.execute(delete_listing_query, (str(listing_id),))
@@ -222,32 +492,68 @@ async def delete_listing(listing_id: UUID):
             cursor.execute(delete_images_query, (str(listing_id),))
 
             connection.commit()
+            mark_recent_write(response)
 
             return {"message": "Listing deleted successfully"}
     
+    except HTTPException:
+        connection.rollback()
+        raise
     except Exception as e:
         connection.rollback()
         logger.error(f"Error deleting listing: {e}")
-        return HTTPException(status_code=500, detail="Internal Server Error")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@app.get("/listings/")
+@app.get("/listings/", response_class=ORJSONResponse, dependencies=[Depends(require_db)])
 async def get_listings_by_filter(
+    request: Request,
     listing_status: str = Query(...),
     listing_type: str = Query(None), 
     animal_type: str = Query(None), 
     user_emails: str = Query(None)):
 
-    global connection
     try:
-        with connection.cursor() as cursor:
+        def load(cursor):
             
-            user_emails_list = user_emails.split(",") if user_emails else []
+            # Repeated emails would repeat rows that the aggregate below counts once
+            user_emails_list = list(dict.fromkeys(user_emails.split(","))) if user_emails else []
+
+            # Validate from a single aggregate over the same filter, so a 304 costs no row,
+            # image or serialization work. Count + id/version digest also catch deleted rows.
+            version_query = """ SELECT count(*), max(updated_at),
+                                    md5(coalesce(string_agg(id::text || ':' || updated_at::text, ',' ORDER BY id), ''))
+                                        FROM listings WHERE listing_status = %s
+                            """
+            version_params = (listing_status,)
+
+            if user_emails_list:
+                version_query += " AND owner_email = ANY(%s)"
+                version_params += (user_emails_list,)
+
+            if listing_type:
+                version_query += " AND listing_type = %s"
+                version_params += (listing_type,)
+
+                if animal_type is not None:
+                    version_query += " AND animal_type = %s"
+                    version_params += (animal_type,)
+
+            cursor.execute(version_query, version_params)
+            count, last_modified, digest = cursor.fetchone()
+
+            etag = make_etag(f"{count}:{digest}".encode())
+            headers = cache_headers(LISTINGS_CACHE_CONTROL, etag, last_modified)
+
+            # Deletions don't move max(updated_at), so If-Modified-Since alone can't be trusted here
+            if is_not_modified(request, etag):
+                return Response(status_code=304, headers=headers)
+
             listings = []
         
             if user_emails_list:
                 for user_email in user_emails_list:
                     query = """ SELECT id, owner_email, animal_type, animal_breed, animal_age, animal_name, 
-                                location, listing_type, animal_price, description
+                                location, listing_type, animal_price, description, updated_at
                                     FROM listings 
                                         WHERE owner_email = %s AND listing_status = %s
                             """
@@ -261,13 +567,14 @@ async def get_listings_by_filter(
                             query += " AND animal_type = %s"
                             params += (animal_type,)
 
-                    cursor.execute(query, params)
+                    # Deterministic order so the ETag always labels the same bytes
+                    cursor.execute(query + " ORDER BY id", params)
                     rows = cursor.fetchall()
                     for row in rows:
                         listings.append(process_row(row, cursor))
             else:
                 query = """ SELECT id, owner_email, animal_type, animal_breed, animal_age, animal_name, 
-                            location, listing_type, animal_price, description 
+                            location, listing_type, animal_price, description, updated_at
                                 FROM listings WHERE listing_status = %s
                         """
                 params = (listing_status,)
@@ -280,29 +587,31 @@ async def get_listings_by_filter(
                         query += " AND animal_type = %s"
                         params += (animal_type,)
 
-                cursor.execute(query, params)
+                cursor.execute(query + " ORDER BY id", params)
                 rows = cursor.fetchall()
                 for row in rows:
                     listings.append(process_row(row, cursor))
 
-        return {"listings": listings}
+            return ORJSONResponse({"listings": listings}, headers=headers)
+
+        return run_read(request, load)
     except Exception as e:
         logger.error(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-@app.get("/listings/user/{user_email}")
+@app.get("/listings/user/{user_email}", response_class=ORJSONResponse, dependencies=[Depends(require_db)])
 async def get_user_listings(
+    request: Request,
     user_email: str,
     listing_status: str = Query(...),
     listing_type: str = Query(None)
 ):
-    global connection
     try:
-        with connection.cursor() as cursor:
+        def load(cursor):
         
             query = """ SELECT id, owner_email, animal_type, animal_breed, animal_age, animal_name, 
-                                location, listing_type, animal_price, description
+                                location, listing_type, animal_price, description, updated_at
                                     FROM listings 
                                         WHERE owner_email = %s AND listing_status = %s
                             """
@@ -319,99 +628,297 @@ async def get_user_listings(
             for row in rows:
                 user_listings.append(process_row(row, cursor))
         
-            return {"user_listings": user_listings}
-    
+            return user_listings
+
+        return ORJSONResponse({"user_listings": run_read(request, load)})
+
     except Exception as e:
         logger.error(f"Error: {e}")
-        return HTTPException(status_code=500, detail="Internal Server Error")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@app.get("/listings/id/{listing_id}")
-async def get_listing_by_id(listing_id: UUID):
-    global connection
+@app.get("/listings/summary", response_class=ORJSONResponse, dependencies=[Depends(require_db)])
+async def get_listings_summary(request: Request, listing_status: str = Query(None)):
     try:
-        with connection.cursor() as cursor:
+        def load(cursor):
+            query = """ SELECT animal_type, listing_status, listing_type, listing_count
+                            FROM listing_type_summary WHERE listing_count > 0
+                    """
+            params = ()
+
+            if listing_status:
+                query += " AND listing_status = %s"
+                params += (listing_status,)
+
+            cursor.execute(query + " ORDER BY animal_type, listing_status, listing_type", params)
+            rows = cursor.fetchall()
+
+            # Per-animal_type totals for the browse page, summed over the (already bounded) breakdown rows
+            totals = {}
+            for animal_type, _, _, count in rows:
+                totals[animal_type] = totals.get(animal_type, 0) + count
+
+            return {
+                "totals": [{"animal_type": animal_type, "count": count} for animal_type, count in totals.items()],
+                "summary": [
+                    {"animal_type": animal_type, "listing_status": status, "listing_type": listing_type, "count": count}
+                    for animal_type, status, listing_type, count in rows
+                ],
+            }
+
+        return ORJSONResponse(run_read(request, load))
+
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/listings/summary/user/{user_email}", response_class=ORJSONResponse, dependencies=[Depends(require_db)])
+async def get_user_listings_summary(request: Request, user_email: str):
+    try:
+        def load(cursor):
+            query = """ SELECT listing_status, listing_type, listing_count
+                            FROM listing_owner_summary WHERE owner_email = %s AND listing_count > 0
+                                ORDER BY listing_status, listing_type
+                    """
+            cursor.execute(query, (user_email,))
+            return [
+                {"listing_status": status, "listing_type": listing_type, "count": count}
+                for status, listing_type, count in cursor.fetchall()
+            ]
+
+        return ORJSONResponse({"user_summary": run_read(request, load)})
+
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/listings/id/{listing_id}", response_class=ORJSONResponse, dependencies=[Depends(require_db)])
+async def get_listing_by_id(listing_id: UUID, request: Request):
+    try:
+        def load(cursor):
 
             query = """ SELECT id, owner_email, animal_type, animal_breed, animal_age, animal_name, 
-                                location, listing_type, animal_price, description FROM listings WHERE id = %s
+                                location, listing_type, animal_price, description, updated_at FROM listings WHERE id = %s
             """
             cursor.execute(query, (str(listing_id),))
             row = cursor.fetchone()
 
             if row:
-                listing_id = row[0]
-                images = get_images_for_listing(listing_id, cursor)
-                listing = {
-                    "listing_id": listing_id,
-                    "owner_email": row[1],
-                    "animal_type": row[2],
-                    "animal_breed": row[3],
-                    "animal_age": row[4],
-                    "animal_name": row[5],
-                    "location": row[6],
-                    "listing_type": row[7],
-                    "animal_price": row[8],
-                    "description": row[9],
-                    "images": images
-                }
-                return {"listing": listing}
+                # The row version identifies the payload, so revalidation skips the images query and serialization
+                last_modified = row[10]
+                etag = make_etag(f"{row[0]}:{last_modified.isoformat()}".encode())
+                headers = cache_headers(LISTING_CACHE_CONTROL, etag, last_modified)
+
+                if is_not_modified(request, etag, last_modified):
+                    return Response(status_code=304, headers=headers)
+
+                return ORJSONResponse({"listing": process_row(row, cursor)}, headers=headers)
             else:
-                return HTTPException(status_code=404, detail="Listing not found")
+                raise HTTPException(status_code=404, detail="Listing not found")
+
+        return run_read(request, load)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {e}")
-        return HTTPException(status_code=500, detail="Internal Server Error")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-def create_tables():
+def create_tables(db_connection):
     try:
-        global connection
-
-        with connection.cursor() as cursor:
-            # Create the 'listings' 
-            create_listings_table = """
-                CREATE TABLE IF NOT EXISTS listings (
-                    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
-                    owner_email VARCHAR NOT NULL,
-                    animal_type VARCHAR NOT NULL,
-                    animal_breed VARCHAR NOT NULL,
-                    animal_age INT NOT NULL,
-                    animal_name VARCHAR NOT NULL,
-                    location VARCHAR NOT NULL,
-                    listing_type VARCHAR(10) CHECK (listing_type IN ('SALE', 'ADOPTION')) NOT NULL,
-                    animal_price DOUBLE PRECISION,
-                    listing_status VARCHAR(10) CHECK (listing_status IN ('ACCEPTED', 'PENDING')) NOT NULL,
-                    description TEXT
-                );
-            """
-
-            cursor = connection.cursor()
-            cursor.execute(create_listings_table)
-
-            # Create the 'images' table with a foreign key reference to listings
-            create_images_table = """
-                CREATE TABLE IF NOT EXISTS images (
-                    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
-                    image_name TEXT NOT NULL,
-                    image_url TEXT NOT NULL,
-                    listing_id UUID REFERENCES listings(id) ON DELETE CASCADE
-                );
-            """
-            cursor.execute(create_images_table)
-
-            connection.commit()
+        with db_connection.cursor() as cursor:
+            # Serialize schema setup across workers; the lock is released on commit/rollback
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+
+            current_version = 0
+            cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+            if cursor.fetchone()[0] is True:
+                cursor.execute("SELECT max(version) FROM schema_version")
+                current_version = cursor.fetchone()[0] or 0
+
+            if current_version >= SCHEMA_VERSION:
+                db_connection.commit()
+                logger.info(f"Database schema is up to date (version {current_version})")
+                return True
+
+            # Only the steps newer than the recorded version run, each exactly once
+            for version, migrate in SCHEMA_MIGRATIONS:
+                if version > current_version:
+                    logger.info(f"Applying schema migration {version}")
+                    migrate(cursor)
+
+            cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT NOT NULL)")
+            cursor.execute("DELETE FROM schema_version")
+            cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
+
+            db_connection.commit()
             logger.info("Tables created successfully in PostgreSQL database")
+            return True
     except (Exception, psycopg2.DatabaseError) as error:
+        db_connection.rollback()
         logger.error(f"Error creating tables: {error}")
+        return False
+
+def migrate_base_tables(cursor):
+    # Create the 'listings' 
+    create_listings_table = """
+        CREATE TABLE IF NOT EXISTS listings (
+            id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+            owner_email VARCHAR NOT NULL,
+            animal_type VARCHAR NOT NULL,
+            animal_breed VARCHAR NOT NULL,
+            animal_age INT NOT NULL,
+            animal_name VARCHAR NOT NULL,
+            location VARCHAR NOT NULL,
+            listing_type VARCHAR(10) CHECK (listing_type IN ('SALE', 'ADOPTION')) NOT NULL,
+            animal_price DOUBLE PRECISION,
+            listing_status VARCHAR(10) CHECK (listing_status IN ('ACCEPTED', 'PENDING')) NOT NULL,
+            description TEXT
+        );
+    """
+
+    cursor.execute(create_listings_table)
+
+    # Create the 'images' table with a foreign key reference to listings
+    create_images_table = """
+        CREATE TABLE IF NOT EXISTS images (
+            id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+            image_name TEXT NOT NULL,
+            image_url TEXT NOT NULL,
+            listing_id UUID REFERENCES listings(id) ON DELETE CASCADE
+        );
+    """
+    cursor.execute(create_images_table)
+
+def migrate_row_version(cursor):
+    # Row version used for ETag / Last-Modified
+    cursor.execute("ALTER TABLE listings ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()")
+
+# Summary rows are always locked in the same order (owner rows before type rows, and
+# within a table by key), so two updates moving listings between the same groups in
+# opposite directions cannot deadlock on each other's summary rows
+LISTING_SUMMARY_FUNCTIONS = """
+    CREATE OR REPLACE FUNCTION adjust_listing_owner_summary(key_owner_email VARCHAR, key_listing_status VARCHAR, key_listing_type VARCHAR, delta INT) RETURNS void AS $$
+        INSERT INTO listing_owner_summary AS summary (owner_email, listing_status, listing_type, listing_count)
+            VALUES (key_owner_email, key_listing_status, key_listing_type, delta)
+            ON CONFLICT (owner_email, listing_status, listing_type)
+            DO UPDATE SET listing_count = summary.listing_count + delta;
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION adjust_listing_type_summary(key_animal_type VARCHAR, key_listing_status VARCHAR, key_listing_type VARCHAR, delta INT) RETURNS void AS $$
+        INSERT INTO listing_type_summary AS summary (animal_type, listing_status, listing_type, listing_count)
+            VALUES (key_animal_type, key_listing_status, key_listing_type, delta)
+            ON CONFLICT (animal_type, listing_status, listing_type)
+            DO UPDATE SET listing_count = summary.listing_count + delta;
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION refresh_listing_summaries() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM adjust_listing_owner_summary(NEW.owner_email, NEW.listing_status, NEW.listing_type, 1);
+            PERFORM adjust_listing_type_summary(NEW.animal_type, NEW.listing_status, NEW.listing_type, 1);
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM adjust_listing_owner_summary(OLD.owner_email, OLD.listing_status, OLD.listing_type, -1);
+            PERFORM adjust_listing_type_summary(OLD.animal_type, OLD.listing_status, OLD.listing_type, -1);
+        ELSE
+            IF (OLD.owner_email, OLD.listing_status, OLD.listing_type) < (NEW.owner_email, NEW.listing_status, NEW.listing_type) THEN
+                PERFORM adjust_listing_owner_summary(OLD.owner_email, OLD.listing_status, OLD.listing_type, -1);
+                PERFORM adjust_listing_owner_summary(NEW.owner_email, NEW.listing_status, NEW.listing_type, 1);
+            ELSIF (OLD.owner_email, OLD.listing_status, OLD.listing_type) > (NEW.owner_email, NEW.listing_status, NEW.listing_type) THEN
+                PERFORM adjust_listing_owner_summary(NEW.owner_email, NEW.listing_status, NEW.listing_type, 1);
+                PERFORM adjust_listing_owner_summary(OLD.owner_email, OLD.listing_status, OLD.listing_type, -1);
+            END IF;
+            IF (OLD.animal_type, OLD.listing_status, OLD.listing_type) < (NEW.animal_type, NEW.listing_status, NEW.listing_type) THEN
+                PERFORM adjust_listing_type_summary(OLD.animal_type, OLD.listing_status, OLD.listing_type, -1);
+                PERFORM adjust_listing_type_summary(NEW.animal_type, NEW.listing_status, NEW.listing_type, 1);
+            ELSIF (OLD.animal_type, OLD.listing_status, OLD.listing_type) > (NEW.animal_type, NEW.listing_status, NEW.listing_type) THEN
+                PERFORM adjust_listing_type_summary(NEW.animal_type, NEW.listing_status, NEW.listing_type, 1);
+                PERFORM adjust_listing_type_summary(OLD.animal_type, OLD.listing_status, OLD.listing_type, -1);
+            END IF;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+def migrate_listing_summaries(cursor):
+    # Aggregate counts kept current by triggers on listings, so summary reads never scan listings
+    create_summary_tables = """
+        CREATE TABLE IF NOT EXISTS listing_owner_summary (
+            owner_email VARCHAR NOT NULL,
+            listing_status VARCHAR(10) NOT NULL,
+            listing_type VARCHAR(10) NOT NULL,
+            listing_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (owner_email, listing_status, listing_type)
+        );
+        CREATE TABLE IF NOT EXISTS listing_type_summary (
+            animal_type VARCHAR NOT NULL,
+            listing_status VARCHAR(10) NOT NULL,
+            listing_type VARCHAR(10) NOT NULL,
+            listing_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (animal_type, listing_status, listing_type)
+        );
+    """
+    cursor.execute(create_summary_tables)
+
+    cursor.execute(LISTING_SUMMARY_FUNCTIONS)
+
+    # Updates only touch the summaries when a grouping column actually changes
+    create_summary_triggers = """
+        DROP TRIGGER IF EXISTS listings_summary_insert_delete ON listings;
+        CREATE TRIGGER listings_summary_insert_delete
+            AFTER INSERT OR DELETE ON listings
+            FOR EACH ROW EXECUTE FUNCTION refresh_listing_summaries();
+        DROP TRIGGER IF EXISTS listings_summary_update ON listings;
+        CREATE TRIGGER listings_summary_update
+            AFTER UPDATE OF owner_email, animal_type, listing_type, listing_status ON listings
+            FOR EACH ROW
+            WHEN (OLD.owner_email IS DISTINCT FROM NEW.owner_email
+                OR OLD.animal_type IS DISTINCT FROM NEW.animal_type
+                OR OLD.listing_type IS DISTINCT FROM NEW.listing_type
+                OR OLD.listing_status IS DISTINCT FROM NEW.listing_status)
+            EXECUTE FUNCTION refresh_listing_summaries();
+    """
+    cursor.execute(create_summary_triggers)
+
+    # Rebuild the summaries from listings; writes are blocked until commit so no change is missed
+    backfill_summaries = """
+        LOCK TABLE listings IN SHARE MODE;
+        TRUNCATE listing_owner_summary, listing_type_summary;
+        INSERT INTO listing_owner_summary (owner_email, listing_status, listing_type, listing_count)
+            SELECT owner_email, listing_status, listing_type, count(*)
+                FROM listings GROUP BY owner_email, listing_status, listing_type;
+        INSERT INTO listing_type_summary (animal_type, listing_status, listing_type, listing_count)
+            SELECT animal_type, listing_status, listing_type, count(*)
+                FROM listings GROUP BY animal_type, listing_status, listing_type;
+    """
+    cursor.execute(backfill_summaries)
+
+def migrate_summary_lock_order(cursor):
+    # Databases created at version 3 still have the trigger function that locks summary rows in OLD, NEW order
+    cursor.execute(LISTING_SUMMARY_FUNCTIONS)
+
+# Append new steps here; SCHEMA_VERSION follows the last one
+SCHEMA_MIGRATIONS = [
+    (1, migrate_base_tables),
+    (2, migrate_row_version),
+    (3, migrate_listing_summaries),
+    (4, migrate_summary_lock_order),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
 
 def upload_image_to_s3(image):
-        try:
-            random_string = str(uuid4())
-            unique_filename = f"{random_string}_{image.filename}"
-            image_url = f"https://{AWS_BUCKET}.s3.{REGION}.amazonaws.com/{unique_filename}"
+        random_string = str(uuid4())
+        unique_filename = f"{random_string}_{image.filename}"
+        image_url = f"https://{AWS_BUCKET}.s3.{REGION}.amazonaws.com/{unique_filename}"
 
-            image_data = BytesIO(image.file.read())
-            s3.upload_fileobj(image_data, AWS_BUCKET, unique_filename, ExtraArgs={"ACL": "public-read", "ContentType": image.content_type})
-            return image_url
-        finally:
-            image_data.close()
+        # Stream the spooled upload in parts instead of copying it into memory first
+        image.file.seek(0)
+        s3.upload_fileobj(image.file, AWS_BUCKET, unique_filename, ExtraArgs={"ACL": "public-read", "ContentType": image.content_type})
+        return image_url
+
+# Uploads run before the listing is written so no transaction (and no summary row lock
+# taken by the listings triggers) is held open while waiting on S3
+def upload_images(images):
+    return [(image.filename, upload_image_to_s3(image)) for image in images if image]
 
 def insert_listing_data(cursor, owner_email, animal_type, animal_breed, animal_age, animal_name, location, listing_type, animal_price, description):
     listing_status = "PENDING"
@@ -429,34 +936,185 @@ def update_listing(cursor, listing_id, owner_email, animal_type, animal_breed, a
         UPDATE listings
         SET owner_email = %s, animal_type = %s, animal_breed = %s, 
         animal_age = %s, animal_name = %s, location = %s, listing_type = %s, animal_price = %s, 
-        listing_status = %s, description = %s
+        listing_status = %s, description = %s, updated_at = now()
         WHERE id = %s
     """
     cursor.execute(update_listing_query, (owner_email, animal_type, animal_breed, animal_age, animal_name, location, listing_type, animal_price, listing_status, description, str(listing_id)))
 
+def connect_replica(replica):
+    host, _, port = replica["host"].partition(":")
+    replica_connection = psycopg2.connect(user=DB_USER, password=DB_PASSWORD, host=host, port=port or DB_PORT, database=DB_DATABASE, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+    replica_connection.set_session(readonly=True, autocommit=True)
+    replica["connection"] = replica_connection
+    return replica_connection
+
+def available_replicas(request):
+    # Clients that wrote recently read from the primary until the replicas catch up
+    if not read_replicas or read_primary_until(request) > time.time():
+        return []
+
+    start = next(replica_counter)
+    now = time.monotonic()
+    ordered = read_replicas[start % len(read_replicas):] + read_replicas[:start % len(read_replicas)]
+    return [replica for replica in ordered if replica["down_until"] <= now]
+
+def read_primary_until(request):
+    # The cookie is client-controlled: values that are malformed or further out than the
+    # server would ever set (e.g. "inf") are treated as absent rather than pinning to the primary
+    try:
+        until = float(request.cookies.get(READ_PRIMARY_COOKIE, 0) or 0)
+    except ValueError:
+        return 0.0
+    if not math.isfinite(until) or until > time.time() + READ_YOUR_WRITES_SECONDS:
+        return 0.0
+    return until
+
+def run_read(request, load):
+    for replica in available_replicas(request):
+        try:
+            replica_connection = replica["connection"]
+            if replica_connection is None or replica_connection.closed:
+                replica_connection = connect_replica(replica)
+
+            with replica_connection.cursor() as cursor:
+                return load(cursor)
+
+        # Any database error counts, e.g. a replica still missing a migration raises UndefinedTable
+        except psycopg2.Error as error:
+            logger.error(f"Read replica {replica['host']} failed, trying next: {error}")
+            replica["down_until"] = time.monotonic() + REPLICA_RETRY_SECONDS
+            if replica["connection"] is not None:
+                replica["connection"].close()
+                replica["connection"] = None
+
+    try:
+        with connection.cursor() as cursor:
+            return load(cursor)
+    finally:
+        end_read_transaction(connection)
+
+# Reads on the primary open a transaction like any other statement; roll it back so the
+# shared connection is not left idle in transaction (or aborted, after a failed query)
+def end_read_transaction(db_connection):
+    try:
+        db_connection.rollback()
+    except psycopg2.Error as e:
+        logger.error(f"Rollback after read failed: {e}")
+
+def mark_recent_write(response):
+    response.set_cookie(READ_PRIMARY_COOKIE, str(time.time() + READ_YOUR_WRITES_SECONDS), max_age=READ_YOUR_WRITES_SECONDS, httponly=True)
+
 def get_images_for_listing(listing_id, cursor):
     cursor.execute("SELECT image_url FROM images WHERE listing_id = %s", (listing_id,))
     image_rows = cursor.fetchall()
     images = [image[0] for image in image_rows] if image_rows else []
     return images
 
+# Compact listing record, serialized natively by orjson in field order.
+# Returning it through ORJSONResponse skips jsonable_encoder. Output matches the
+# previous per-row dicts for the values listings hold (strings, ints, ordinary
+# prices, None); orjson differs from json.dumps only on exponent-formatted
+# floats (1e16 vs 1e+16, 1e-5 vs 1e-05) and NaN/Infinity (null instead of an error).
+@dataclass
+class Listing:
+    __slots__ = (
+        "listing_id", "owner_email", "animal_type", "animal_breed", "animal_age",
+        "animal_name", "location", "listing_type", "animal_price", "description", "images",
+    )
+    listing_id: str
+    owner_email: str
+    animal_type: str
+    animal_breed: str
+    animal_age: int
+    animal_name: str
+    location: str
+    listing_type: str
+    animal_price: Optional[float]
+    description: Optional[str]
+    images: list
+
 def process_row(row, cursor):
-    listing_id, owner_email, animal_type, animal_breed, animal_age, \
-        animal_name, location, listing_type, animal_price, description = row
-
-    images = get_images_for_listing(listing_id, cursor)
-
-    listing = {
-        "listing_id": listing_id,
-        "owner_email": owner_email,
-        "animal_type": animal_type,
-        "animal_breed": animal_breed,
-        "animal_age": animal_age,
-        "animal_name": animal_name,
-        "location": location,
-        "listing_type": listing_type,
-        "animal_price": animal_price,
-        "description": description,
-        "images": images
-    }
-    return listing
\ No newline at end of file
+    images = get_images_for_listing(row[0], cursor)
+    return Listing(*row[:10], images)
+
+def client_id(scope, headers):
+    # Only the hops appended by trusted proxies count; anything further left is client-supplied
+    if RATE_LIMIT_TRUSTED_PROXIES and "x-forwarded-for" in headers:
+        hops = [hop.strip() for hop in headers["x-forwarded-for"].split(",") if hop.strip()]
+        if hops:
+            return hops[-min(RATE_LIMIT_TRUSTED_PROXIES, len(hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def route_path(scope):
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    # Unknown paths share one bucket per client, so random 404s cannot mint new buckets
+    return "<unmatched>"
+
+def take_token(key, rate, burst):
+    now = time.monotonic()
+    bucket = rate_limit_buckets.get(key)
+    if bucket is None:
+        while len(rate_limit_buckets) >= RATE_LIMIT_MAX_BUCKETS:
+            rate_limit_buckets.popitem(last=False)
+        bucket = rate_limit_buckets[key] = [burst, now]
+    else:
+        rate_limit_buckets.move_to_end(key)
+
+    tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    if tokens < 1:
+        bucket[0] = tokens
+        return max(1, math.ceil((1 - tokens) / rate))
+
+    bucket[0] = tokens - 1
+    return 0
+
+def limit_response(status_code, detail, retry_after=None):
+    headers = {"Retry-After": str(retry_after)} if retry_after else None
+    return ORJSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+def accepted_encodings(accept_encoding):
+    encodings = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+def encoded_etag(etag, encoding):
+    return f'{etag[:-1]}-{encoding}"'
+
+def decoded_etag(etag):
+    for encoding in ETAG_ENCODINGS:
+        if etag.endswith(f'-{encoding}"'):
+            return etag[:-len(encoding) - 2] + '"'
+    return etag
+
+def make_etag(data):
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+def cache_headers(cache_control, etag, last_modified=None):
+    headers = {"Cache-Control": cache_control, "ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+def is_not_modified(request, etag, last_modified=None):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [decoded_etag(tag.strip().removeprefix("W/")) for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+    return False
\ No newline at end of file
@@ -1,8 +1,24 @@
-import pytest
+import pytest, psycopg2, asyncio, time
 from uuid import uuid4
+from datetime import datetime, timezone
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
-from main import app, connect_db
+from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi.responses import JSONResponse, ORJSONResponse
+import main
+from main import app, connect_db, connect_db_with_backoff, validate_listings, create_tables, process_row, Listing, SCHEMA_VERSION
+
+UPDATED_AT = datetime(2023, 12, 1, 10, 30, 15, 123456, tzinfo=timezone.utc)
+
+@pytest.fixture(autouse=True)
+def database_ready():
+    with patch('main.db_ready', True):
+        yield
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    main.rate_limit_buckets.clear()
+    yield
+    main.rate_limit_buckets.clear()
 
 @pytest.fixture
 def test_client():
@@ -35,6 +51,142 @@ def test_health(test_client):
     assert response.status_code == 200
     assert response.json() == {"status": "Server is healthy"}
 
+def test_connect_db_with_backoff_retries_until_connected():
+
+    sleep = AsyncMock()
+
+    with patch('main.connect_db', side_effect=[False, False, True]) as mock_connect, \
+            patch('main.asyncio.sleep', sleep), patch('main.db_ready', False):
+        asyncio.run(connect_db_with_backoff())
+        assert main.db_ready is True
+
+    assert mock_connect.call_count == 3
+    delays = [call.args[0] for call in sleep.call_args_list]
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 0.5
+    assert 0 <= delays[1] <= 1.0
+
+def test_create_tables_skips_current_schema(mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.fetchone.side_effect = [(True,), (SCHEMA_VERSION,)]
+    mock_connection.cursor.return_value = mock_cursor
+
+    assert create_tables(mock_connection) is True
+
+    statements = [call.args[0] for call in mock_cursor.execute.call_args_list]
+    assert statements[0].startswith("SELECT pg_advisory_xact_lock")
+    assert not any("CREATE TABLE" in statement for statement in statements)
+    mock_connection.commit.assert_called_once()
+
+@pytest.mark.parametrize("current_version, expected_steps", [
+    (None, [1, 2, 3]),
+    (2, [3]),
+])
+def test_create_tables_runs_pending_migrations(mock_db_connection, current_version, expected_steps):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.fetchone.side_effect = [(False,)] if current_version is None else [(True,), (current_version,)]
+    mock_connection.cursor.return_value = mock_cursor
+
+    steps = [(version, MagicMock()) for version in (1, 2, 3)]
+    with patch('main.SCHEMA_MIGRATIONS', steps):
+        assert create_tables(mock_connection) is True
+
+    assert [version for version, migrate in steps if migrate.called] == expected_steps
+    mock_cursor.execute.assert_any_call("INSERT INTO schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
+
+def test_connect_db_keeps_connection_until_schema_ready(mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', None), patch('main.create_tables', return_value=False):
+        assert connect_db() is False
+        assert main.connection is None
+
+    mock_connection.close.assert_called_once()
+
+def test_create_tables_reports_failure(mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.execute.side_effect = psycopg2.OperationalError("lock timeout")
+    mock_connection.cursor.return_value = mock_cursor
+
+    assert create_tables(mock_connection) is False
+    mock_connection.rollback.assert_called_once()
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/listings/?listing_status=ACCEPTED"),
+    ("get", f"/listings/id/{uuid4()}"),
+    ("delete", f"/listings/{uuid4()}"),
+])
+def test_handlers_unavailable_until_ready(test_client, method, path):
+
+    with patch('main.db_ready', False), patch('main.connection', None):
+        response = getattr(test_client, method)(path)
+
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Database not ready"}
+
+def test_ready_not_ready(test_client):
+
+    with patch('main.db_ready', False):
+        response = test_client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Database not ready"}
+
+def test_ready(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_connection.closed = 0
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection), patch('main.db_ready', True):
+        response = test_client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "read_replicas": 0, "read_replicas_available": 0}
+    mock_connection.rollback.assert_called_once()
+
+def test_ready_database_unreachable(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_connection.closed = 0
+    mock_cursor.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection), patch('main.db_ready', True):
+        response = test_client.get("/ready")
+
+    assert response.status_code == 503
+    mock_connection.rollback.assert_called_once()
+
+def test_get_listing_by_id_primary_error_rolls_back(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.execute.side_effect = psycopg2.errors.QueryCanceled("canceling statement due to statement timeout")
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        response = test_client.get(f"/listings/id/{uuid4()}")
+
+    assert response.status_code == 500
+    mock_connection.rollback.assert_called_once()
+
+def test_get_listing_by_id_not_found_ends_transaction(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.fetchone.return_value = None
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        response = test_client.get(f"/listings/id/{uuid4()}")
+
+    assert response.status_code == 404
+    mock_connection.rollback.assert_called_once()
+
 @pytest.mark.parametrize("animal_age, listing_type, animal_price, files, expected_status_code, expected_message", [
     (2, 'SALE', 100, None, 200, "Listing created successfully"),
     (2, 'ADOPTION', None, None, 200, "Listing created successfully"),
@@ -79,10 +231,14 @@ def test_create_listing_failure(test_client, animal_age, listing_type, animal_pr
         "description": "This is a test listing"
     }
 
-    response = test_client.post("/listings/", data=form_data)
+    mock_connection = MagicMock()
+    with patch('main.connection', mock_connection), patch('main.upload_image_to_s3') as mock_upload:
+        response = test_client.post("/listings/", data=form_data, files=[('images', ('test.jpg', b'image', 'image/jpeg'))])
 
-    assert response.json()['status_code'] == expected_status_code
+    assert response.status_code == expected_status_code
     assert response.json()['detail'] == expected_detail
+    mock_connection.cursor.assert_not_called()
+    mock_upload.assert_not_called()
 
 @pytest.mark.parametrize("animal_age, listing_type, animal_price, files, expected_status_code, expected_message", [
     (2, 'SALE', 100, None, 200, "Listing updated successfully"),
@@ -110,6 +266,43 @@ def test_edit_listing_success(test_client, animal_age, listing_type, animal_pric
     assert response.status_code == expected_status_code
     assert response.json()['message'] == expected_message
 
+@pytest.mark.parametrize("method, path", [
+    ("post", "/listings/"),
+    ("put", f"/listings/{uuid4()}"),
+])
+def test_images_uploaded_before_listing_is_written(test_client, method, path):
+
+    form_data = {"owner_email": "test@example.com", "animal_type": "Dog", "animal_breed": "Labrador", "animal_age": 2,
+                 "animal_name": "Buddy", "location": "New York", "listing_type": "ADOPTION"}
+    files = [('images', ('a.jpg', b'image-a', 'image/jpeg')), ('images', ('b.jpg', b'image-b', 'image/jpeg'))]
+
+    calls = []
+    mock_connection = MagicMock()
+    mock_cursor = mock_connection.cursor.return_value.__enter__.return_value
+    mock_connection.cursor.side_effect = lambda: calls.append("cursor") or mock_connection.cursor.return_value
+    mock_cursor.fetchone.return_value = ("listing-id",)
+    upload = MagicMock(side_effect=lambda image: calls.append(f"upload {image.filename}") or f"https://bucket/{image.filename}")
+
+    with patch('main.connection', mock_connection), patch('main.upload_image_to_s3', upload):
+        response = getattr(test_client, method)(path, data=form_data, files=files)
+
+    assert response.status_code == 200
+    assert calls == ["upload a.jpg", "upload b.jpg", "cursor"]
+    image_inserts = [call.args[1][:2] for call in mock_cursor.execute.call_args_list if call.args[0].startswith("INSERT INTO images")]
+    assert image_inserts == [("a.jpg", "https://bucket/a.jpg"), ("b.jpg", "https://bucket/b.jpg")]
+
+def test_summary_lock_order_migration_replaces_trigger_function():
+
+    mock_cursor = MagicMock()
+
+    assert SCHEMA_VERSION == 4
+    assert main.SCHEMA_MIGRATIONS[-1] == (4, main.migrate_summary_lock_order)
+    main.migrate_summary_lock_order(mock_cursor)
+
+    statement = mock_cursor.execute.call_args.args[0]
+    assert "CREATE OR REPLACE FUNCTION refresh_listing_summaries()" in statement
+    assert "(OLD.owner_email, OLD.listing_status, OLD.listing_type) < (NEW.owner_email, NEW.listing_status, NEW.listing_type)" in statement
+
 @pytest.mark.parametrize("animal_age, listing_type, animal_price, expected_status_code, expected_detail", [
     (0, 'SALE', 100, 400, "Price and age must be greater than 0"),
     (2, 'INVALID_TYPE', None, 400, "Invalid listing_type. Allowed values are 'SALE' or 'ADOPTION'."),
@@ -131,10 +324,34 @@ def test_edit_listing_invalid_input(test_client, animal_age, listing_type, anima
         "description": "Updated test listing"
     }
 
-    response = test_client.put(f"/listings/{listing_id}", data=form_data)
+    mock_connection = MagicMock()
+    with patch('main.connection', mock_connection):
+        response = test_client.put(f"/listings/{listing_id}", data=form_data)
 
-    assert response.json()['status_code'] == expected_status_code
+    assert response.status_code == expected_status_code
     assert response.json()['detail'] == expected_detail
+    mock_connection.cursor.assert_not_called()
+
+def test_validate_listings_batch():
+
+    valid = {
+        "owner_email": "test@example.com",
+        "animal_type": "Dog",
+        "animal_breed": "Labrador",
+        "animal_age": 2,
+        "animal_name": "Buddy",
+        "location": "New York",
+        "listing_type": "SALE",
+        "animal_price": 100,
+    }
+
+    listings, errors = validate_listings([valid, dict(valid, listing_type="ADOPTION", animal_price=None)])
+    assert [listing.listing_type for listing in listings] == ["SALE", "ADOPTION"]
+    assert errors == {}
+
+    listings, errors = validate_listings([valid, dict(valid, animal_age=0), dict(valid, animal_price=None)])
+    assert len(listings) == 1
+    assert errors == {1: "Price and age must be greater than 0", 2: "Price is required for SALE listings"}
 
 def test_edit_listing_listing_not_found(test_client, mock_db_connection):
     
@@ -159,7 +376,7 @@ def test_edit_listing_listing_not_found(test_client, mock_db_connection):
     with patch('main.connection', mock_connection):
         response = test_client.put(f"/listings/{listing_id}", data=form_data)
     
-    assert response.json()['status_code'] == 404
+    assert response.status_code == 404
     assert response.json()['detail'] == "Listing not found"
     
 def test_delete_listing_success(test_client):
@@ -182,7 +399,7 @@ def test_delete_listing_not_found(test_client, mock_db_connection):
     with patch('main.connection', mock_connection):
         response = test_client.delete(f"/listings/{listing_id}")
 
-    assert response.json()['status_code'] == 404
+    assert response.status_code == 404
     assert response.json()['detail'] == "Listing not found"
 
 def test_update_listing_status_success(test_client):
@@ -206,11 +423,14 @@ def test_update_listing_status_failure(test_client):
         "listing_status": "PENDING"
     }
 
-    response = test_client.put(f"/listings/{listing_id}/status", data=form_data)
+    mock_connection = MagicMock()
+    with patch('main.connection', mock_connection):
+        response = test_client.put(f"/listings/{listing_id}/status", data=form_data)
 
     print(response.json())
 
-    assert response.json()['status_code'] == 400
+    assert response.status_code == 400
+    mock_connection.cursor.assert_not_called()
     assert response.json()['detail'] == "Invalid listing_status. Allowed values are 'ACCEPTED'"
 
 def test_update_listing_status_not_found(test_client, mock_db_connection):
@@ -224,7 +444,7 @@ def test_update_listing_status_not_found(test_client, mock_db_connection):
     with patch('main.connection', mock_connection):
         response = test_client.put(f"/listings/{listing_id}/status", data={"listing_status": "ACCEPTED"})
 
-    assert response.json()['status_code'] == 404
+    assert response.status_code == 404
     assert response.json()['detail'] == "Listing not found"
 
 @pytest.mark.parametrize("params", [
@@ -252,7 +472,7 @@ def test_get_listings_by_filter(test_client, mock_db_connection, params):
     }]  
 
     fetchall_return_values = [
-        [tuple(listing.values()) for listing in listings],  # First fetchall call
+        [tuple(listing.values()) + (UPDATED_AT,) for listing in listings],  # First fetchall call
         None 
     ]
 
@@ -260,6 +480,7 @@ def test_get_listings_by_filter(test_client, mock_db_connection, params):
         return fetchall_return_values.pop(0)
 
     mock_cursor.fetchall.side_effect = mock_fetchall
+    mock_cursor.fetchone.return_value = (1, UPDATED_AT, "digest")
 
     mock_connection.cursor.return_value = mock_cursor
 
@@ -282,6 +503,7 @@ def test_get_listings_by_filter_no_results(test_client, mock_db_connection):
     mock_connection, mock_cursor = mock_db_connection
 
     mock_cursor.fetchall.return_value = []
+    mock_cursor.fetchone.return_value = (0, None, "digest")
     mock_connection.cursor.return_value = mock_cursor
 
     with patch('main.connection', mock_connection):
@@ -314,7 +536,7 @@ def test_get_user_listings(test_client, mock_db_connection):
     }]  
 
     fetchall_return_values = [
-        [tuple(listing.values()) for listing in listings], 
+        [tuple(listing.values()) + (UPDATED_AT,) for listing in listings], 
         None 
     ]
 
@@ -357,7 +579,7 @@ def test_get_listings_by_id(test_client, mock_db_connection):
         "description": "Description"
     }
 
-    mock_cursor.fetchone.return_value = tuple(listing.values())
+    mock_cursor.fetchone.return_value = tuple(listing.values()) + (UPDATED_AT,)
     mock_cursor.fetchall.return_value = []
     mock_connection.cursor.return_value = mock_cursor
 
@@ -370,3 +592,467 @@ def test_get_listings_by_id(test_client, mock_db_connection):
     assert response.json() == {
         "listing": listing
     }
+    assert response.headers["etag"]
+    assert response.headers["last-modified"] == "Fri, 01 Dec 2023 10:30:15 GMT"
+    assert response.headers["cache-control"] == "no-cache"
+
+def test_get_listings_by_id_not_found(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.fetchone.return_value = None
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        response = test_client.get(f"/listings/id/{uuid4()}")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Listing not found"}
+
+def test_delete_listing_database_error(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.execute.side_effect = psycopg2.OperationalError("connection lost")
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        response = test_client.delete(f"/listings/{uuid4()}")
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Internal Server Error"}
+    mock_connection.rollback.assert_called_once()
+
+@pytest.mark.parametrize("header", ["etag", "last-modified"])
+def test_get_listings_by_id_not_modified(test_client, mock_db_connection, header):
+
+    mock_connection, mock_cursor = mock_db_connection
+
+    listing_id = str(uuid4())
+    row = (listing_id, "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+
+    mock_cursor.fetchone.return_value = row
+    mock_cursor.fetchall.return_value = []
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+
+        first = test_client.get(f"/listings/id/{listing_id}")
+        validator = {"etag": "If-None-Match", "last-modified": "If-Modified-Since"}[header]
+        mock_cursor.fetchall.reset_mock()
+        response = test_client.get(f"/listings/id/{listing_id}", headers={validator: first.headers[header]})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == first.headers["etag"]
+    mock_cursor.fetchall.assert_not_called()
+
+def test_get_listings_by_filter_not_modified(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+
+    row = (str(uuid4()), "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+
+    mock_cursor.fetchall.side_effect = lambda: [row] if "FROM listings" in mock_cursor.execute.call_args[0][0] else []
+    mock_cursor.fetchone.return_value = (1, UPDATED_AT, "digest")
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+
+        first = test_client.get("/listings/?listing_status=ACCEPTED&user_emails=a@example.com,b@example.com")
+        mock_cursor.fetchall.reset_mock()
+        response = test_client.get("/listings/?listing_status=ACCEPTED&user_emails=a@example.com,b@example.com",
+                                   headers={"If-None-Match": first.headers["etag"]})
+        not_modified_fetches = mock_cursor.fetchall.call_count
+
+        mock_cursor.fetchone.return_value = (0, UPDATED_AT, "other-digest")
+        changed = test_client.get("/listings/?listing_status=ACCEPTED&user_emails=a@example.com,b@example.com",
+                                  headers={"If-None-Match": first.headers["etag"]})
+
+    version_query, version_params = mock_cursor.execute.call_args_list[0][0]
+    row_queries = [call.args[0] for call in mock_cursor.execute.call_args_list if "owner_email = %s" in call.args[0]]
+    assert row_queries and all(query.endswith(" ORDER BY id") for query in row_queries)
+    assert "count(*)" in version_query and "owner_email = ANY(%s)" in version_query
+    assert version_params == ("ACCEPTED", ["a@example.com", "b@example.com"])
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "public, max-age=10"
+    assert first.headers["last-modified"] == "Fri, 01 Dec 2023 10:30:15 GMT"
+    assert response.status_code == 304
+    assert response.content == b""
+    assert not_modified_fetches == 0
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+
+def test_get_listings_by_filter_deduplicates_emails(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.fetchall.return_value = []
+    mock_cursor.fetchone.return_value = (0, None, "digest")
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        response = test_client.get("/listings/?listing_status=ACCEPTED&user_emails=a@example.com,a@example.com")
+
+    row_queries = [call for call in mock_cursor.execute.call_args_list if "owner_email = %s" in call.args[0]]
+    assert response.status_code == 200
+    assert len(row_queries) == 1
+    assert mock_cursor.execute.call_args_list[0].args[1] == ("ACCEPTED", ["a@example.com"])
+
+@pytest.mark.parametrize("animal_price, description", [
+    (1000.00, None),
+    (None, "Adoption only"),
+    (1234.56, "Price with cents"),
+    (0.1, "Ünïcödé — description"),
+    (99999999.99, ""),
+    (0.5, "Half price"),
+])
+def test_listing_serialization_matches_default_encoder(animal_price, description):
+
+    row = (str(uuid4()), "test@example.com", "Dog", "Labrador", 2, "Bóbi", "São Paulo", "SALE", animal_price, description)
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [("https://bucket.s3.region.amazonaws.com/image.jpg",)]
+
+    listing = process_row(row, mock_cursor)
+    listing_dict = dict(zip(Listing.__slots__, row + (["https://bucket.s3.region.amazonaws.com/image.jpg"],)))
+
+    assert ORJSONResponse({"listings": [listing]}).body == JSONResponse({"listings": [listing_dict]}).body
+
+@pytest.mark.parametrize("accept_encoding, expected_encoding", [
+    ("br, gzip", "br"),
+    ("gzip, deflate", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("identity", None),
+])
+def test_listings_response_compression(test_client, mock_db_connection, accept_encoding, expected_encoding):
+
+    mock_connection, mock_cursor = mock_db_connection
+
+    rows = [
+        (str(uuid4()), "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+        for _ in range(50)
+    ]
+
+    mock_cursor.fetchall.side_effect = lambda: rows if "FROM listings" in mock_cursor.execute.call_args[0][0] else []
+    mock_cursor.fetchone.return_value = (50, UPDATED_AT, "digest")
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+
+        response = test_client.get("/listings/?listing_status=ACCEPTED", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == expected_encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].endswith(f'-{expected_encoding}"' if expected_encoding else '"')
+    assert len(response.json()["listings"]) == 50
+
+def test_compressed_etag_revalidation(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+
+    rows = [
+        (str(uuid4()), "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+        for _ in range(50)
+    ]
+
+    mock_cursor.fetchall.side_effect = lambda: rows if "FROM listings" in mock_cursor.execute.call_args[0][0] else []
+    mock_cursor.fetchone.return_value = (50, UPDATED_AT, "digest")
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        br = test_client.get("/listings/?listing_status=ACCEPTED", headers={"Accept-Encoding": "br"})
+        identity = test_client.get("/listings/?listing_status=ACCEPTED", headers={"Accept-Encoding": "identity"})
+        revalidated = test_client.get("/listings/?listing_status=ACCEPTED",
+                                      headers={"Accept-Encoding": "br", "If-None-Match": br.headers["etag"]})
+
+    assert br.headers["etag"] != identity.headers["etag"]
+    assert br.headers["etag"] == identity.headers["etag"][:-1] + '-br"'
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == br.headers["etag"]
+    assert revalidated.headers["vary"] == "Accept-Encoding"
+
+def test_small_response_not_compressed(test_client):
+
+    response = test_client.get("/health/", headers={"Accept-Encoding": "br, gzip"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+def make_replica(host, fetchone=None, error=None):
+    replica_connection = MagicMock()
+    replica_connection.closed = 0
+    replica_cursor = MagicMock()
+    replica_cursor.__enter__.return_value = replica_cursor
+    replica_cursor.fetchone.return_value = fetchone
+    replica_cursor.fetchall.return_value = []
+    if error:
+        replica_connection.cursor.side_effect = error
+    else:
+        replica_connection.cursor.return_value = replica_cursor
+    return {"host": host, "connection": replica_connection, "down_until": 0.0}
+
+def test_get_listing_by_id_reads_from_replicas(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_connection.cursor.return_value = mock_cursor
+
+    listing_id = str(uuid4())
+    row = (listing_id, "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+    replicas = [make_replica("replica-1", row), make_replica("replica-2", row)]
+
+    with patch('main.connection', mock_connection), patch('main.read_replicas', replicas):
+        for _ in range(4):
+            response = test_client.get(f"/listings/id/{listing_id}")
+            assert response.status_code == 200
+            assert response.json()["listing"]["listing_id"] == listing_id
+
+    assert replicas[0]["connection"].cursor.call_count == 2
+    assert replicas[1]["connection"].cursor.call_count == 2
+    mock_connection.cursor.assert_not_called()
+
+def test_get_listing_by_id_falls_back_to_primary(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+
+    listing_id = str(uuid4())
+    row = (listing_id, "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+    mock_cursor.fetchone.return_value = row
+    mock_cursor.fetchall.return_value = []
+    mock_connection.cursor.return_value = mock_cursor
+
+    replicas = [make_replica("replica-1", error=psycopg2.OperationalError("replica down"))]
+
+    with patch('main.connection', mock_connection), patch('main.read_replicas', replicas):
+        response = test_client.get(f"/listings/id/{listing_id}")
+        assert replicas[0]["down_until"] > 0
+        assert replicas[0]["connection"] is None
+        test_client.get(f"/listings/id/{listing_id}")
+
+    assert response.status_code == 200
+    assert response.json()["listing"]["listing_id"] == listing_id
+    assert mock_connection.cursor.call_count == 2
+
+def test_get_listing_by_id_falls_back_on_replica_schema_error(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+
+    listing_id = str(uuid4())
+    row = (listing_id, "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+    mock_cursor.fetchone.return_value = row
+    mock_cursor.fetchall.return_value = []
+    mock_connection.cursor.return_value = mock_cursor
+
+    replicas = [make_replica("replica-1", row)]
+    replica_cursor = replicas[0]["connection"].cursor.return_value
+    replica_cursor.execute.side_effect = psycopg2.errors.UndefinedTable('relation "listings" does not exist')
+
+    with patch('main.connection', mock_connection), patch('main.read_replicas', replicas):
+        response = test_client.get(f"/listings/id/{listing_id}")
+
+    assert response.status_code == 200
+    assert response.json()["listing"]["listing_id"] == listing_id
+    assert replicas[0]["down_until"] > 0
+    mock_connection.cursor.assert_called_once()
+
+def test_connect_replica_uses_short_timeout():
+
+    replica = {"host": "replica-1:5433", "connection": None, "down_until": 0.0}
+
+    with patch('main.psycopg2.connect') as mock_connect:
+        replica_connection = main.connect_replica(replica)
+
+    assert mock_connect.call_args.kwargs["connect_timeout"] == main.REPLICA_CONNECT_TIMEOUT
+    assert mock_connect.call_args.kwargs["host"] == "replica-1"
+    assert mock_connect.call_args.kwargs["port"] == "5433"
+    replica_connection.set_session.assert_called_once_with(readonly=True, autocommit=True)
+    assert replica["connection"] is replica_connection
+
+def test_reads_stick_to_primary_after_write(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+
+    listing_id = str(uuid4())
+    row = (listing_id, "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+    mock_cursor.fetchone.return_value = row
+    mock_cursor.fetchall.return_value = []
+    mock_connection.cursor.return_value = mock_cursor
+
+    replicas = [make_replica("replica-1", row)]
+
+    with patch('main.connection', mock_connection), patch('main.read_replicas', replicas):
+        write = test_client.put(f"/listings/{listing_id}/status", data={"listing_status": "ACCEPTED"})
+        response = test_client.get(f"/listings/id/{listing_id}", cookies=write.cookies)
+
+    assert "read_primary_until" in write.cookies
+    assert response.status_code == 200
+    replicas[0]["connection"].cursor.assert_not_called()
+
+def test_rate_limit_per_client_and_route(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection), patch('main.WRITE_RATE_LIMIT_BURST', 2), patch('main.WRITE_RATE_LIMIT_RATE', 0.5):
+        responses = [test_client.delete(f"/listings/{uuid4()}") for _ in range(3)]
+        other_route = test_client.put(f"/listings/{uuid4()}/status", data={"listing_status": "ACCEPTED"})
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert responses[2].json() == {"detail": "Too many requests"}
+    assert responses[2].headers["retry-after"] == "2"
+    assert other_route.status_code == 200
+
+def test_rate_limit_buckets_capped_for_unmatched_paths(test_client):
+
+    with patch('main.RATE_LIMIT_MAX_BUCKETS', 5), patch('main.RATE_LIMIT_TRUSTED_PROXIES', 1):
+        responses = [test_client.get(f"/nope/{i}", headers={"X-Forwarded-For": f"10.0.0.{i}"}) for i in range(50)]
+
+    assert {response.status_code for response in responses} == {404}
+    assert list(main.rate_limit_buckets) == [(f"10.0.0.{i}", "GET", "<unmatched>") for i in range(45, 50)]
+
+def test_rate_limit_buckets_evict_least_recently_used():
+
+    with patch('main.RATE_LIMIT_MAX_BUCKETS', 2):
+        main.take_token("a", 1, 5)
+        main.take_token("b", 1, 5)
+        main.take_token("a", 1, 5)
+        main.take_token("c", 1, 5)
+
+    assert list(main.rate_limit_buckets) == ["a", "c"]
+
+def test_upload_admission_control(test_client):
+
+    form_data = {"owner_email": "test@example.com", "animal_type": "Dog", "animal_breed": "Labrador", "animal_age": 0,
+                 "animal_name": "Buddy", "location": "New York", "listing_type": "ADOPTION"}
+    files = [('images', ('test.jpg', b'image', 'image/jpeg'))]
+
+    with patch.dict('main.limit_counters', {"uploads_in_flight": 8}):
+        busy = test_client.post("/listings/", data=form_data, files=files)
+        rejected = main.limit_counters["uploads_rejected"]
+
+    with patch('main.UPLOAD_MAX_INFLIGHT_BYTES', 10):
+        too_large = test_client.post("/listings/", data=form_data, files=files)
+
+    admitted = test_client.post("/listings/", data=form_data, files=files)
+
+    assert busy.status_code == 503
+    assert busy.headers["retry-after"] == "2"
+    assert rejected == 1
+    assert too_large.status_code == 413
+    assert admitted.status_code == 400
+    assert main.limit_counters["uploads_in_flight"] == 0
+    assert main.limit_counters["upload_bytes_in_flight"] == 0
+
+def test_limits_metrics(test_client):
+
+    test_client.get("/health/")
+    response = test_client.get("/metrics/limits")
+
+    assert response.status_code == 200
+    assert set(response.json()) == {"rate_limited", "uploads_admitted", "uploads_rejected", "uploads_too_large",
+                                    "uploads_in_flight", "upload_bytes_in_flight", "rate_limit_buckets"}
+
+def test_get_listings_summary(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.fetchall.return_value = [("Cat", "ACCEPTED", "ADOPTION", 4), ("Dog", "ACCEPTED", "ADOPTION", 3), ("Dog", "ACCEPTED", "SALE", 7)]
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        response = test_client.get("/listings/summary?listing_status=ACCEPTED")
+
+    query, params = mock_cursor.execute.call_args[0]
+    assert "FROM listing_type_summary" in query
+    assert params == ("ACCEPTED",)
+    assert response.status_code == 200
+    assert response.json() == {
+        "totals": [{"animal_type": "Cat", "count": 4}, {"animal_type": "Dog", "count": 10}],
+        "summary": [
+            {"animal_type": "Cat", "listing_status": "ACCEPTED", "listing_type": "ADOPTION", "count": 4},
+            {"animal_type": "Dog", "listing_status": "ACCEPTED", "listing_type": "ADOPTION", "count": 3},
+            {"animal_type": "Dog", "listing_status": "ACCEPTED", "listing_type": "SALE", "count": 7},
+        ],
+    }
+
+def test_get_user_listings_summary(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_cursor.fetchall.return_value = [("ACCEPTED", "SALE", 2), ("PENDING", "ADOPTION", 1)]
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection):
+        response = test_client.get("/listings/summary/user/test@example.com")
+
+    query, params = mock_cursor.execute.call_args[0]
+    assert "FROM listing_owner_summary" in query
+    assert params == ("test@example.com",)
+    assert response.status_code == 200
+    assert response.json() == {"user_summary": [
+        {"listing_status": "ACCEPTED", "listing_type": "SALE", "count": 2},
+        {"listing_status": "PENDING", "listing_type": "ADOPTION", "count": 1},
+    ]}
+
+@pytest.mark.parametrize("cookie, expected_primary", [
+    ("abc", False),
+    ("nan", False),
+    ("inf", False),
+    ("1e400", False),
+    ("9999999999", False),
+    ("0", False),
+    ("recent-write", True),
+])
+def test_read_primary_cookie_parsed_defensively(cookie, expected_primary):
+
+    if cookie == "recent-write":
+        cookie = str(time.time() + main.READ_YOUR_WRITES_SECONDS - 1)
+
+    request = MagicMock()
+    request.cookies = {"read_primary_until": cookie}
+
+    with patch('main.read_replicas', [make_replica("replica-1")]):
+        until = main.read_primary_until(request)
+        replicas = main.available_replicas(request)
+
+    assert until <= time.time() + main.READ_YOUR_WRITES_SECONDS
+    assert (replicas == []) is expected_primary
+
+def test_malformed_read_primary_cookie(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_connection.cursor.return_value = mock_cursor
+
+    listing_id = str(uuid4())
+    row = (listing_id, "test@example.com", "Dog", "Labrador", 2, "Buddy", "New York", "SALE", 1000.00, "Description", UPDATED_AT)
+    replicas = [make_replica("replica-1", row)]
+
+    with patch('main.connection', mock_connection), patch('main.read_replicas', replicas):
+        response = test_client.get(f"/listings/id/{listing_id}", cookies={"read_primary_until": "abc"})
+
+    assert response.status_code == 200
+    assert response.json()["listing"]["listing_id"] == listing_id
+    replicas[0]["connection"].cursor.assert_called_once()
+
+@pytest.mark.parametrize("trusted_proxies, forwarded_for, expected", [
+    (0, "10.0.0.1, 1.2.3.4", "testclient"),
+    (1, "10.0.0.1, 1.2.3.4", "1.2.3.4"),
+    (2, "10.0.0.1, 5.6.7.8, 1.2.3.4", "5.6.7.8"),
+    (2, "1.2.3.4", "1.2.3.4"),
+])
+def test_client_id_uses_trusted_hops(trusted_proxies, forwarded_for, expected):
+
+    headers = main.Headers(headers={"x-forwarded-for": forwarded_for})
+
+    with patch('main.RATE_LIMIT_TRUSTED_PROXIES', trusted_proxies):
+        assert main.client_id({"client": ("testclient", 50000)}, headers) == expected
+
+def test_rate_limit_not_bypassed_by_forwarded_for(test_client, mock_db_connection):
+
+    mock_connection, mock_cursor = mock_db_connection
+    mock_connection.cursor.return_value = mock_cursor
+
+    with patch('main.connection', mock_connection), patch('main.RATE_LIMIT_TRUSTED_PROXIES', 1), \
+            patch('main.WRITE_RATE_LIMIT_BURST', 1), patch('main.WRITE_RATE_LIMIT_RATE', 0.5):
+        responses = [
+            test_client.delete(f"/listings/{uuid4()}", headers={"X-Forwarded-For": f"10.0.0.{n}, 1.2.3.4"})
+            for n in range(5)
+        ]
+
+    assert [response.status_code for response in responses] == [200, 429, 429, 429, 429]